@@ -79,65 +79,312 @@ get_volume()
 caller()
     Create object and call one of its methods as requested by the cmdline args
 
-"""
-
-from proxmoxer import ProxmoxAPI
-from proxmoxer import ResourceException
+batch()
+    Run many operations from a JSON file within one process
 
-from netapp_ontap import HostConnection
-from netapp_ontap.resources import Volume, Snapshot, FileClone, CLI
-from netapp_ontap.error import NetAppRestError
+"""
 
-from time import gmtime, strftime, sleep
+from time import sleep, time
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from contextlib import contextmanager, ExitStack
+import fcntl
+import json
+import tempfile
+import concurrent.futures
+import functools
+import os
 import os.path
+import random
+import re
 import sys
-import argparse, argcomplete
+import argparse
 import logging
 import configparser
-from pprint import pprint
 
-# disable warnings from the urllib module
+# only silence the urllib3 noise from verify=False deployments; every other
+# warning (deprecations, SDK hints) stays visible
 import warnings
-warnings.simplefilter("ignore")
+warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+
+def _import_sdks():
+    """Import the API SDKs on first use
+
+    proxmoxer and netapp_ontap pull in a large import graph (requests,
+    urllib3, marshmallow, ...); loading them lazily keeps --help and
+    argparse error paths fast.
+    """
+    if 'ProxmoxAPI' in globals():
+        return
+    global ProxmoxAPI, ResourceException, HostConnection, Volume, Snapshot, FileClone, NetAppRestError, HTTPAdapter, Retry
+    from proxmoxer import ProxmoxAPI
+    from proxmoxer import ResourceException
+    from netapp_ontap import HostConnection
+    from netapp_ontap.resources import Volume, Snapshot, FileClone
+    from netapp_ontap.error import NetAppRestError
+    from requests.adapters import HTTPAdapter, Retry
+
+# timestamp format shared by all snapshot names of one create invocation
+_TS_FMT = "%Y-%m-%d_%H:%M:%S+0000"
+
+_LOG_FORMAT = "%(levelname)s:%(filename)s:%(funcName)s:%(message)s"
+
+_LOG_LEVELS = {
+    'info': logging.INFO,
+    'warn': logging.WARN,
+    'error': logging.ERROR,
+    'debug': logging.DEBUG
+}
+
+# disk entries in a VM config look like 'scsi0: storage:100/vm-100-disk-0.qcow2,size=32G'
+_DISK_KEY_RE = re.compile(r'^(ide|sata|scsi|virtio)\d+$')
+_DISK_FMT_RE = re.compile(r'\.(qcow2|raw|vmdk)\b|format=(qcow2|raw|vmdk)')
+
+def _retry(fn, *, attempts=4, base=0.2):
+    """Call fn, retrying transient REST failures with jittered exponential backoff
+
+    A dropped TCP connection against a busy Proxmox or ONTAP master should
+    not cost a full re-run; only after the retries are exhausted does the
+    exception propagate to the usual error handling.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except (ResourceException, NetAppRestError, ConnectionError) as e:
+            if attempt == attempts - 1:
+                raise
+            delay = base * 2 ** attempt + random.random() * 0.1
+            logging.warning('transient error (%s), retrying in %.1fs', e, delay)
+            sleep(delay)
+
+def tune_session(session):
+    """Mount a pooled HTTPAdapter with retries on a requests session"""
+    if session is None:
+        return
+    session.mount('https://', HTTPAdapter(pool_connections=32,
+                                          pool_maxsize=32,
+                                          max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
+
+# cache of authenticated Proxmox clients keyed by (host, user, verify) so
+# repeated VM/Storage construction reuses one session instead of logging in again
+_PROX_CLIENTS = {}
+
+def get_prox(config):
+    """Return a cached ProxmoxAPI client, creating it on first use"""
+    _import_sdks()
+    host = config['proxmox']['proxmox_host']
+    user = config['proxmox']['proxmox_user']
+    verify = config.getboolean('proxmox', 'proxmox_verify')
+    key = (host, user, verify)
+    if key not in _PROX_CLIENTS:
+        prox = ProxmoxAPI(host, user=user, password=config['proxmox']['proxmox_pass'], verify_ssl=verify)
+        tune_session(getattr(prox._backend, 'session', None))
+        _PROX_CLIENTS[key] = prox
+    return _PROX_CLIENTS[key]
+
+# cache of HostConnections keyed by (host, user, verify) so back-to-back ONTAP
+# calls reuse one TLS session instead of handshaking per operation; the library
+# tracks the *active* connection on a thread-local stack, so every call site
+# must activate the cached connection with `with ontap_conn(access):` -- a
+# one-time activation would leak across filers and never reach worker threads
+_ONTAP_CONNS = {}
+
+def ontap_conn(access):
+    """Return a cached HostConnection for the filer, creating it on first use"""
+    _import_sdks()
+    key = (access['host'], access['user'], access['verify'])
+    if key not in _ONTAP_CONNS:
+        conn = HostConnection(access['host'],
+                              access['user'],
+                              access['pass'],
+                              verify=access['verify'])
+        tune_session(getattr(conn, 'session', None))
+        _ONTAP_CONNS[key] = conn
+    return _ONTAP_CONNS[key]
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(path, mtime_ns):
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    return parser
+
+def load_config(path):
+    """Parse the config file, cached until the file changes on disk"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime_ns = 0
+    return _load_config_cached(path, mtime_ns)
+
+# a second create within this window borrows the snapshot just taken by the
+# first instead of posting another one
+_BORROW_WINDOW = 5.0
+
+def _last_snap_path(host, volume_name):
+    """Return the sidecar file recording the last snapshot of a volume
+
+    Keyed by filer host as well: different filers routinely carry volumes
+    with identical names, and those must never borrow from each other.
+    """
+    state_dir = '/var/lib/pve-ontap'
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+    except OSError:
+        state_dir = tempfile.gettempdir()
+    # the dir may exist but be owned by root when running unprivileged
+    if not os.access(state_dir, os.W_OK):
+        state_dir = tempfile.gettempdir()
+    return os.path.join(state_dir, f'last_snap_{host}_{volume_name}.json')
+
+def _read_last_snap(host, volume_name):
+    """Return the recorded {name, created_at} of the last snapshot, or None"""
+    try:
+        with open(_last_snap_path(host, volume_name)) as sidecar:
+            return json.load(sidecar)
+    except (OSError, ValueError):
+        return None
+
+def _write_last_snap(host, volume_name, name):
+    """Atomically record the name and creation time of the last snapshot
+
+    The record is best effort: the snapshot already exists at this point, so
+    a write failure only disables borrowing, it must not fail the create.
+    """
+    path = _last_snap_path(host, volume_name)
+    try:
+        with open(f'{path}.tmp', 'w') as sidecar:
+            json.dump({'name': name, 'created_at': time()}, sidecar)
+        os.replace(f'{path}.tmp', path)
+    except OSError as e:
+        logging.debug('cannot write last-snapshot record: %s', e)
+
+@contextmanager
+def volume_lock(host, volume_name):
+    """Serialize snapshot operations on a volume with an exclusive file lock"""
+    lock_dir = '/var/lock' if os.access('/var/lock', os.W_OK) else tempfile.gettempdir()
+    lock_path = os.path.join(lock_dir, f'pve-ontap-{host}-{volume_name}.lock')
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# PVE storage entries per Proxmox host, fetched once via /storage instead of
+# one GET per storage name and persisted across invocations with a short TTL
+_STORAGE_INDEX = {}
+_STORAGE_CACHE_FILE = os.path.expanduser('~/.cache/pve-ontap-snapshot/storage.json')
+_STORAGE_CACHE_TTL = 60.0
+
+def _read_storage_cache():
+    """Return the on-disk storage metadata cache, or an empty dict"""
+    try:
+        with open(_STORAGE_CACHE_FILE) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+def _write_storage_cache(cache):
+    """Atomically rewrite the on-disk storage metadata cache"""
+    try:
+        os.makedirs(os.path.dirname(_STORAGE_CACHE_FILE), exist_ok=True)
+        with open(f'{_STORAGE_CACHE_FILE}.tmp', 'w') as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(f'{_STORAGE_CACHE_FILE}.tmp', _STORAGE_CACHE_FILE)
+    except OSError as e:
+        logging.debug('cannot write storage cache: %s', e)
+
+def get_storage_index(config):
+    """Return all PVE storage entries keyed by storage name, cached in memory and on disk
+
+    Takes the config rather than a client so the Proxmox login is only paid
+    on an actual cache miss.
+    """
+    key = config['proxmox']['proxmox_host']
+    if key in _STORAGE_INDEX:
+        return _STORAGE_INDEX[key]
+    cache = _read_storage_cache()
+    entry = cache.get(key)
+    if entry and time() < entry['expires_at']:
+        index = entry['value']
+    else:
+        try:
+            index = {store['storage']: store for store in _retry(get_prox(config).storage.get)}
+        except Exception as e:
+            if entry:
+                logging.warning('storage listing failed (%s), serving stale cache', e)
+                index = entry['value']
+            else:
+                raise
+        else:
+            cache[key] = {'value': index, 'expires_at': time() + _STORAGE_CACHE_TTL}
+            _write_storage_cache(cache)
+    _STORAGE_INDEX[key] = index
+    return index
+
+def invalidate_storage_index(config):
+    """Drop the cached storage listing after the storage layout changed"""
+    key = config['proxmox']['proxmox_host']
+    _STORAGE_INDEX.pop(key, None)
+    cache = _read_storage_cache()
+    if cache.pop(key, None) is not None:
+        _write_storage_cache(cache)
+
+# normalized ONTAP access dicts per config section, so the dict copy and the
+# verify coercion happen once instead of per Storage construction
+_ACCESS_CACHE = {}
+
+def get_access(config, section):
+    """Return the normalized ONTAP access dict for a config section"""
+    if section not in _ACCESS_CACHE:
+        access = dict(config[section])
+        access['verify'] = config.getboolean(section, 'verify')
+        _ACCESS_CACHE[section] = access
+    return _ACCESS_CACHE[section]
+
+@functools.lru_cache(maxsize=128)
+def _get_volume_cached(vol, host, user, password, verify):
+    """Fetch a volume by name, memoized for the lifetime of the run"""
+    with ontap_conn({'host': host, 'user': user, 'pass': password, 'verify': verify}):
+        for volume in Volume.get_collection(name=vol, fields='uuid,name,svm,clone', max_records=1):
+            return volume
 
 def get_volume(vol, access):
     """Return volume object from volume name"""
-    logging.debug(f'parameters: {vol}, {access}')
-    with HostConnection(access['host'],
-                        access['user'],
-                        access['pass'],
-                        verify=access['verify']):
-        volumes = Volume.get_collection()
-        for volume in volumes:
-            if volume['name'] == vol:
-                volume.get()
-                return volume
+    logging.debug('parameters: %s, %s', vol, access)
+    return _get_volume_cached(vol, access['host'], access['user'], access['pass'], access['verify'])
 
 class VM:
     def __init__(self, id, config) -> None:
         """Initialise VM object"""
-        logging.debug(f'VM init parameters: {id}, {dict(config)}')
+        logging.debug('VM init parameters: %s, %s', id, config)
         self.id = id
-        self.prox = ProxmoxAPI(config['proxmox']['proxmox_host'], user=config['proxmox']['proxmox_user'], password=config['proxmox']['proxmox_pass'], verify_ssl=(True if config['proxmox']['proxmox_verify'].lower() == 'true' else False))
-        nodes = self.prox.nodes.get()
-        logging.debug(f'Found Proxmox nodes: {nodes}')
-        for node in nodes:
-            try:
-                self.status = self.prox.nodes(node['node']).qemu(self.id).status.current.get()['status']
-                self.name = self.prox.nodes(node['node']).qemu(self.id).status.current.get()['name']
-                self.config = self.prox.nodes(node['node']).qemu(self.id).config.get()
-                self.node = node['node']
+        self.prox = get_prox(config)
+        resources = self.prox.cluster.resources.get(type='vm')
+        logging.debug('Found Proxmox VM resources: %s', resources)
+        for resource in resources:
+            if resource['vmid'] == int(self.id):
+                self.node = resource['node']
+                self.name = resource['name']
+                self.status = resource['status']
                 break
-            except ResourceException as e:
-                pass
-        self.storages = []
+        else:
+            logging.error('vm %s not found on any node', self.id)
+            sys.exit(1)
+        self._qemu = self.prox.nodes(self.node).qemu(self.id)
+        self.config = self._qemu.config.get()
+        storages_by_name = {}
         for key, value in self.config.items():
-            if ('ide' in key or 'sata' in key or 'scsi' in key) and ('qcow2' in value or 'raw' in value or 'vmdk' in value) and 'cdrom' not in value:
-                storage_name = value.split(':')[0]
-                storage_disk = value.split(':')[1].split(',')[0]
-                storage = Storage(storage_name, config)
-                storage.add_vm_disk(storage_disk)
-                self.storages.append(storage)
+            if not _DISK_KEY_RE.match(key):
+                continue
+            if 'cdrom' in value or not _DISK_FMT_RE.search(value):
+                continue
+            storage_name, rest = value.split(':', 1)
+            storage_disk = rest.split(',', 1)[0]
+            if storage_name not in storages_by_name:
+                storages_by_name[storage_name] = Storage(storage_name, config)
+            storages_by_name[storage_name].add_vm_disk(storage_disk)
+        self.storages = list(storages_by_name.values())
 
     def __str__(self) -> str:
         """Print VM object in human readable format"""
@@ -150,61 +397,72 @@ class VM:
             Storage:        {([str(storage).strip() for storage in self.storages])}
         """
 
+    def _wait_task(self, upid, terminal='stopped'):
+        """Poll a Proxmox task with exponential backoff until it reaches the terminal status"""
+        delay = 0.1
+        while True:
+            status = self.prox.nodes(self.node).tasks(upid).status.get()['status']
+            logging.debug(status)
+            if status == terminal:
+                break
+            sleep(delay)
+            delay = min(delay * 2, 2.0)
+
     def shutdown(self):
         """Shutdown the VM represented by the VM object"""
-        logging.info(f'shutting down vm {self.id} ({self.name})...')
+        logging.info('shutting down vm %s (%s)...', self.id, self.name)
         try:
-            task = self.prox.nodes(self.node).qemu(self.id).status.shutdown.post()
-            logging.debug(f'upid: {task}')
-            while True:
-                status = self.prox.nodes(self.node).tasks(task).status.get()['status']
-                logging.debug(status)
-                if status == 'stopped':
-                    self.status = self.prox.nodes(self.node).qemu(self.id).status.current.get()['status']
-                    break
-                else:
-                    sleep(1)
+            task = self._qemu.status.shutdown.post()
+            logging.debug('upid: %s', task)
+            self._wait_task(task)
+            self.status = 'stopped'
         except ResourceException as e:
             logging.error(e)
             sys.exit(1)
-        logging.info(f'...done')
+        logging.info('...done')
 
     def suspend(self):
         """Suspend the VM represented by the VM object"""
-        logging.info(f'suspending vm {self.id} ({self.name})...')
+        logging.info('suspending vm %s (%s)...', self.id, self.name)
         try:
-            task = self.prox.nodes(self.node).qemu(self.id).status.suspend.post(todisk=1)
-            logging.debug(f'upid: {task}')
-            while True:
-                status = self.prox.nodes(self.node).tasks(task).status.get()['status']
-                logging.debug(status)
-                if status == 'stopped':
-                    self.status = self.prox.nodes(self.node).qemu(self.id).status.current.get()['status']
-                    break
-                else:
-                    sleep(1)
+            task = self._qemu.status.suspend.post(todisk=1)
+            logging.debug('upid: %s', task)
+            self._wait_task(task)
+            self.status = 'stopped'
         except ResourceException as e:
             logging.error(e)
             sys.exit(1)
-        logging.info(f'...done')
+        logging.info('...done')
 
     def start(self):
         """Start the VM represented by the VM object"""
-        logging.info(f'starting vm {self.id} ({self.name})...')
+        logging.info('starting vm %s (%s)...', self.id, self.name)
         try:
-            task = self.prox.nodes(self.node).qemu(self.id).status.start.post()
-            logging.debug(f'upid: {task}')
-            while True:
-                status = self.prox.nodes(self.node).tasks(task).status.get()['status']
-                logging.debug(status)
-                if status == 'running':
-                    break
-                else:
-                    sleep(1)
+            task = self._qemu.status.start.post()
+            logging.debug('upid: %s', task)
+            self._wait_task(task, terminal='running')
         except ResourceException as e:
             logging.error(e)
             sys.exit(1)
-        logging.info(f'...done')
+        logging.info('...done')
+
+    def _clone_one(self, storage, disk, timestamp):
+        """Clone a single disk of the VM using ObjectClone"""
+        volume = get_volume(storage.volume_name, storage.access)
+        # disk paths are ONTAP paths with forward slashes regardless of host OS
+        path = PurePosixPath(disk)
+        vm_dir = str(path.parent)
+        snapshot_name = f'{path.stem}-snapshot-{timestamp}{path.suffix}'
+        request_body = {'volume':
+                            {'name': volume.name,
+                                'uuid': volume.uuid},
+                        'source_path': f'images/{disk}',
+                        'destination_path': f'images/{vm_dir}/{snapshot_name}',
+                        'overwrite_destination': False
+                        }
+        file_clone = FileClone(**request_body)
+        with ontap_conn(storage.access):
+            _retry(file_clone.post)
 
     def create(self, suspend=False, shutdown=False):
         """Create snapshots of the VMs disks using ObjectClone"""
@@ -215,43 +473,48 @@ class VM:
         if self.status != 'stopped':
             logging.warning('creating snapshot of a running vm, the result might be inconsistent')
 
-        logging.info(f'creating vm {self.id} ({self.name}) disk snapshot...')
-        timestamp = strftime("%Y-%m-%d_%H:%M:%S+0000", gmtime())
-        for storage in self.storages:
-            volume = get_volume(storage.volume_name, storage.access)
-            vm_dir, filename = os.path.split(storage.disk)
-            snapshot_name = f'{os.path.splitext(filename)[0]}-snapshot-{timestamp}{os.path.splitext(filename)[1]}'
-            request_body = {'volume':
-                                {'name': volume.name,
-                                    'uuid': volume.uuid},
-                            'source_path': f'images/{storage.disk}',
-                            'destination_path': f'images/{vm_dir}/{snapshot_name}',
-                            'overwrite_destination': False
-                            }
-            file_clone = FileClone(**request_body)
-            with HostConnection(storage.access['host'],
-                                storage.access['user'],
-                                storage.access['pass'],
-                                verify=storage.access['verify']):
-                file_clone.post()
-        logging.info(f'...done')
+        logging.info('creating vm %s (%s) disk snapshot...', self.id, self.name)
+        timestamp = datetime.now(timezone.utc).strftime(_TS_FMT)
+        disks = [(storage, disk) for storage in self.storages for disk in storage.disks]
+        with ExitStack() as locks:
+            # deduplicate: two Proxmox storages may share one backing volume,
+            # and a second flock on the same file would hang forever; sorted
+            # order keeps concurrent creates from deadlocking on each other
+            for host, volume_name in sorted({(storage.access['host'], storage.volume_name) for storage in self.storages}):
+                locks.enter_context(volume_lock(host, volume_name))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, max(1, len(disks)))) as executor:
+                futures = [executor.submit(self._clone_one, storage, disk, timestamp) for storage, disk in disks]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+        logging.info('...done')
         if suspend or shutdown:
             self.start()
 
 class Storage:
     def __init__(self, storage, config) -> None:
         """Initialise Storage object"""
-        logging.debug(f'Storage init parameters: {storage}, {dict(config)}')
+        logging.debug('Storage init parameters: %s, %s', storage, config)
         self.storage = storage
-        self.prox = ProxmoxAPI(config['proxmox']['proxmox_host'], user=config['proxmox']['proxmox_user'], password=config['proxmox']['proxmox_pass'], verify_ssl=(True if config['proxmox']['proxmox_verify'].lower() == 'true' else False))
+        self._config = config
+        self.access = get_access(config, storage.removesuffix('-CLONE'))
+        self.disks = []
+
+    @functools.cached_property
+    def prox(self):
+        """Proxmox client, created on first use so pure-ONTAP commands skip the login"""
+        return get_prox(self._config)
+
+    @functools.cached_property
+    def volume_name(self):
+        """Name of the ONTAP volume backing the storage, resolved on first use"""
         try:
-            self.volume_name = self.prox.storage(storage).get()['export'].strip('/')
+            return get_storage_index(self._config)[self.storage]['export'].strip('/')
         except ResourceException as e:
             logging.error(e)
             sys.exit(1)
-        self.access = dict(config[storage.removesuffix('-CLONE')])
-        self.access['verify'] = True if self.access['verify'].lower() == 'true' else False
-        self.disk = ''
+        except KeyError:
+            logging.error('storage %s not found in Proxmox', self.storage)
+            sys.exit(1)
 
     def __str__(self) -> str:
         """Print Storage object in human readable format"""
@@ -260,74 +523,72 @@ class Storage:
             PVE connection: {self.prox},
             Storage volume: {self.volume_name},
             Storage access: {self.access},
-            VM disk:        {self.disk}
+            VM disks:       {self.disks}
         """
 
     def add_vm_disk(self, disk_name):
         """Add a VM disk to the Storage object"""
-        self.disk = disk_name
+        self.disks.append(disk_name)
 
-    def create(self):
+    def create(self, no_borrow=False):
         """Create a snapshot of the Storage object using volume snapshots"""
-        logging.info(f'creating storage {self.storage} snapshot...')
-        volume = get_volume(self.volume_name, self.access)
-        timestamp = strftime("%Y-%m-%d_%H:%M:%S+0000", gmtime())
-        snapshot = Snapshot.from_dict({
-            "name": f'proxmox_snapshot_{timestamp}',
-            "comment": f"Snapshot of Proxmox storage {self.storage}",
-            "volume": {'name': volume.name, 'uuid': volume.uuid}
-        })
-        logging.debug(snapshot)
-        with HostConnection(self.access['host'],
-                            self.access['user'],
-                            self.access['pass'],
-                            verify=self.access['verify']):
-            snapshot.post()
-        logging.info(f'...done')
+        logging.info('creating storage %s snapshot...', self.storage)
+        with volume_lock(self.access['host'], self.volume_name):
+            last = None if no_borrow else _read_last_snap(self.access['host'], self.volume_name)
+            if last and time() - last['created_at'] < _BORROW_WINDOW:
+                logging.info('borrowing snapshot %s created %.1fs ago', last['name'], time() - last['created_at'])
+                return
+            volume = get_volume(self.volume_name, self.access)
+            timestamp = datetime.now(timezone.utc).strftime(_TS_FMT)
+            snapshot = Snapshot.from_dict({
+                "name": f'proxmox_snapshot_{timestamp}',
+                "comment": f"Snapshot of Proxmox storage {self.storage}",
+                "volume": {'uuid': volume.uuid}
+            })
+            logging.debug(snapshot)
+            with ontap_conn(self.access):
+                _retry(snapshot.post)
+            _write_last_snap(self.access['host'], self.volume_name, f'proxmox_snapshot_{timestamp}')
+        logging.info('...done')
 
     def restore(self, snapshot):
         """Restore a volume from a given volume snapshot"""
-        logging.info(f'restore snapshot {snapshot} to storage {self.storage}...')
+        logging.info('restore snapshot %s to storage %s...', snapshot, self.storage)
         volume = get_volume(self.volume_name, self.access)
-        with HostConnection(self.access['host'],
-                            self.access['user'],
-                            self.access['pass'],
-                            verify=self.access['verify']):
-            CLI().execute('volume snapshot restore', vserver=volume.svm.name, volume=volume.name, snapshot=snapshot, force=True)
-        logging.info(f'...done')
+        with ontap_conn(self.access):
+            Volume(uuid=volume.uuid).patch(**{'restore_to.snapshot.name': snapshot})
+        _get_volume_cached.cache_clear()
+        logging.info('...done')
+
+    def _delete_one(self, snap):
+        """Delete a single snapshot, activating the connection in the worker thread"""
+        with ontap_conn(self.access):
+            snap.delete()
 
     def delete(self, snapshot):
         """Delete a volume snapshot"""
-        logging.info(f'deleting snapshot {snapshot}...')
+        logging.info('deleting snapshot %s...', snapshot)
         volume = get_volume(self.volume_name, self.access)
-        with HostConnection(self.access['host'],
-                            self.access['user'],
-                            self.access['pass'],
-                            verify=self.access['verify']):
-            avail_snaps = Snapshot.get_collection(volume.uuid)
-            for snap in avail_snaps:
-                if snapshot == snap.name:
-                    snap.delete()
-        logging.info(f'...done')
+        with ontap_conn(self.access):
+            snaps = list(Snapshot.get_collection(volume.uuid, name=snapshot, fields='name,uuid'))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, max(1, len(snaps)))) as executor:
+            futures = [executor.submit(self._delete_one, snap) for snap in snaps]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        logging.info('...done')
 
     def list(self):
         """List a volume snapshots of a Storage object"""
-        logging.info(f'list storage {self.storage} snapshots...')
+        logging.info('list storage %s snapshots...', self.storage)
         volume = get_volume(self.volume_name, self.access)
-        with HostConnection(self.access['host'],
-                            self.access['user'],
-                            self.access['pass'],
-                            verify=self.access['verify']):
-            available_snapshots = Snapshot.get_collection(volume.uuid)
-            for snapshot in available_snapshots:
-                if 'proxmox_snapshot_' in snapshot.name:
-                    snapshot.get()
-                    logging.info(f'Name: {snapshot.name}, Comment: {snapshot.comment}')
-        logging.info(f'...done')
+        with ontap_conn(self.access):
+            for snapshot in Snapshot.get_collection(volume.uuid, name='proxmox_snapshot_*', fields='name,comment', max_records=100):
+                logging.info('Name: %s, Comment: %s', snapshot.name, snapshot.comment)
+        logging.info('...done')
 
     def mount(self, snapshot):
         """Mount a snapshot using FlexClone and add is a storage to Proxmox"""
-        logging.info(f'mounting volume {self.storage} snapshot...')
+        logging.info('mounting volume %s snapshot...', self.storage)
         parent_volume = get_volume(self.volume_name, self.access)
         request_body = {'name': f'{self.volume_name}_clone',
                         'svm': {'name': parent_volume.svm.name},
@@ -340,115 +601,269 @@ class Storage:
                         'nas': {'path': f'/{self.volume_name}_clone'}
                        }
         volume = Volume(**request_body)
-        with HostConnection(self.access['host'],
-                            self.access['user'],
-                            self.access['pass'],
-                            verify=self.access['verify']):
+        # fetch the PVE storage metadata while ONTAP creates the FlexClone
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            store_future = executor.submit(self.prox.storage(self.storage).get)
             try:
-                volume.post(hydrate=True)
+                # no hydrate: the clone path is known up front, so there is no
+                # need to poll the job and re-fetch the volume representation
+                with ontap_conn(self.access):
+                    volume.post()
             except NetAppRestError as e:
                 logging.error(e)
-
-        store = self.prox.storage(self.storage).get()
+            store = store_future.result()
         self.prox.storage.post(storage=f'{self.storage}-CLONE', server=store['server'], type=store['type'], content=store['content'], export=f'/{self.volume_name}_clone')
-        logging.info(f'...done')
+        invalidate_storage_index(self._config)
+        _get_volume_cached.cache_clear()
+        logging.info('...done')
         
     def unmount(self):
         """Remove a FlexClone volume and remove its storage from Proxmox"""
-        logging.info(f'unmounting mounted volume snapshot {self.storage}...')
+        logging.info('unmounting mounted volume snapshot %s...', self.storage)
         volume = get_volume(self.volume_name, self.access)
         if not volume.clone.is_flexclone:
-            logging.error(f'{self.storage} is not a mounted volume snapshot!')
+            logging.error('%s is not a mounted volume snapshot!', self.storage)
             sys.exit(1)
 
         self.prox.storage(self.storage).delete()
-        with HostConnection(self.access['host'],
-                            self.access['user'],
-                            self.access['pass'],
-                            verify=self.access['verify']):
+        invalidate_storage_index(self._config)
+        with ontap_conn(self.access):
             volume.delete(force=True)
-        logging.info(f'...done')
+        _get_volume_cached.cache_clear()
+        logging.info('...done')
 
     def show(self):
         """Show metadata of the volume backing the storage"""
         volume = get_volume(self.volume_name, self.access)
-        pprint(volume.to_dict())
+        # the cached lookup only carries a few projected fields; hydrate the
+        # full record before printing it
+        with ontap_conn(self.access):
+            volume.get()
+        json.dump(volume.to_dict(), sys.stdout, indent=2, default=str)
+        sys.stdout.write('\n')
+
+def expand_storages(args):
+    """Expand a comma-separated or 'all' -storage argument into single targets"""
+    storage = getattr(args, 'storage', None)
+    if storage is None:
+        return [None]
+    if storage == 'all':
+        index = get_storage_index(config)
+        return sorted(name for name in index if config.has_section(name.removesuffix('-CLONE')))
+    storages = storage.split(',')
+    for name in storages:
+        if not name or not config.has_section(name.removesuffix('-CLONE')):
+            logging.error('unknown storage: %s', name or '(empty)')
+            sys.exit(1)
+    return storages
 
 def caller(args):
     """Create object and call one of its methods as requested by the cmdline args"""
     logging.debug(args)
-    context = args.context((args.vm if 'vm' in args else args.storage), config)
-    logging.debug(str(context))
-    cmd = getattr(context, args.cmd)
-    parameters = {}
-    for arg, value in vars(args).items():
-        if arg not in ['config', 'loglevel', 'vm', 'storage', 'func', 'context', 'cmd']:
-            parameters[arg] = value
-    logging.debug(f'options: {parameters}')
-    cmd(**parameters)
-
-if __name__ == '__main__':
+    parameters = {name: getattr(args, name) for name in args.params}
+    logging.debug('options: %s', parameters)
+    if getattr(args, 'vm', None) is not None:
+        vm_ids = str(args.vm).split(',')
+        for vm_id in vm_ids:
+            if not vm_id.isdigit():
+                logging.error('invalid vm id: %s', vm_id)
+                sys.exit(1)
+        targets = [('vm', vm_id) for vm_id in vm_ids]
+    else:
+        targets = [('storage', name) for name in expand_storages(args)]
+    for attr, target in targets:
+        if target is not None:
+            setattr(args, attr, target)
+        context = args.build(args, config)
+        logging.debug('%s', context)
+        getattr(context, args.cmd)(**parameters)
+
+def batch(args):
+    """Run many operations from a JSON file within one process"""
+    logging.debug(args)
+    with open(args.file) as batch_file:
+        operations = json.load(batch_file)
+    for operation in operations:
+        logging.debug('batch operation: %s', operation)
+        if operation['context'] == 'vm':
+            context = VM(operation['vm'], config)
+        else:
+            context = Storage(operation['storage'], config)
+        parameters = {key: value for key, value in operation.items() if key not in ['context', 'cmd', 'vm', 'storage']}
+        getattr(context, operation['cmd'])(**parameters)
+
+def socket_path():
+    """Return the path of the daemon socket"""
+    if os.access('/run', os.W_OK):
+        return '/run/pve-ontap-snapshot.sock'
+    return os.path.join(tempfile.gettempdir(), 'pve-ontap-snapshot.sock')
+
+def forward_to_daemon(argv):
+    """Forward the command line to a running daemon, return True when handled"""
+    import socket
+    path = socket_path()
+    if not os.path.exists(path):
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        return False
+    with sock:
+        sock.sendall(json.dumps(argv).encode() + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    reply = json.loads(data or '{}')
+    logging.debug('daemon reply: %s', reply)
+    # relay whatever the command printed or logged inside the daemon
+    sys.stdout.write(reply.get('output', ''))
+    if reply.get('status') != 'ok':
+        logging.error('daemon error: %s', reply.get('error'))
+        sys.exit(1)
+    return True
+
+def daemon(args):
+    """Serve CLI commands over a Unix socket, keeping API connections warm"""
+    import asyncio
+    import io
+    import threading
+    from contextlib import redirect_stdout
+
+    parser = build_parser()
+    # redirect_stdout swaps the process-wide sys.stdout, so commands must not
+    # run concurrently or their captured output would interleave
+    dispatch_lock = threading.Lock()
+
+    def dispatch(argv):
+        cmd_args = parser.parse_args(argv)
+        buffer = io.StringIO()
+        root = logging.getLogger()
+        error = None
+        # the global config must not change between its assignment and the
+        # command run, so the load happens under the same lock
+        with dispatch_lock:
+            global config
+            config = load_config(cmd_args.config)
+            handler = logging.StreamHandler(buffer)
+            handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+            handler.setLevel(_LOG_LEVELS[cmd_args.loglevel])
+            old_level = root.level
+            root.setLevel(min(old_level, handler.level))
+            root.addHandler(handler)
+            try:
+                with redirect_stdout(buffer):
+                    cmd_args.func(cmd_args)
+            except (Exception, SystemExit) as e:
+                # keep the captured diagnostics: the client needs to see why
+                error = str(e)
+            finally:
+                root.removeHandler(handler)
+                root.setLevel(old_level)
+        return buffer.getvalue(), error
+
+    async def handle(reader, writer):
+        try:
+            line = await reader.readline()
+            argv = json.loads(line)
+            logging.info('daemon request: %s', argv)
+            output, error = await asyncio.to_thread(dispatch, argv)
+            if error is None:
+                reply = {'status': 'ok', 'output': output}
+            else:
+                reply = {'status': 'error', 'error': error, 'output': output}
+        except (Exception, SystemExit) as e:
+            reply = {'status': 'error', 'error': str(e)}
+        writer.write(json.dumps(reply).encode() + b'\n')
+        await writer.drain()
+        writer.close()
+
+    async def serve():
+        path = socket_path()
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(handle, path=path)
+        logging.info('daemon listening on %s', path)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+def build_parser():
+    """Build the argument parser with all sub-commands"""
     parser = argparse.ArgumentParser()
     parser.add_argument('-config', type=str, default='config.ini', help='Path to config file, default is "./config.ini"')
     parser.add_argument('-loglevel', choices=['info', 'warn', 'error', 'debug'], default='info', help='Set the loglevel, default is info')
+    parser.add_argument('-via-daemon', action='store_true', help='Hand the command to a running daemon instead of executing it locally')
     parser.set_defaults(func=caller)
     subparsers = parser.add_subparsers(title='Proxmox operations', required=True)
     subparser_vm = subparsers.add_parser('vm', help='Snapshots in VM context')
     subparser_storage = subparsers.add_parser('storage', help='Snapshots in Storage context')
+    subparser_batch = subparsers.add_parser('batch', help='Run many operations from a JSON file in one process')
+    subparser_batch.add_argument('-file', type=str, required=True, help='Path to a JSON file with a list of operations')
+    subparser_batch.set_defaults(func=batch)
+    subparser_daemon = subparsers.add_parser('daemon', help='Run as a daemon serving commands over a Unix socket')
+    subparser_daemon.set_defaults(func=daemon)
 
     parser_vm = subparser_vm.add_subparsers(title='VM actions', required=True)
     parser_vm_create = parser_vm.add_parser('create', help='Create a VM snapshot using ONTAP ObjectClone')
-    parser_vm_create.add_argument('-vm', type=int, required=True, help='Proxmox VM ID')
+    parser_vm_create.add_argument('-vm', type=str, required=True, help='Proxmox VM ID or a comma-separated list of IDs')
     parser_vm_create.add_argument('-suspend', action='store_true', help='Suspend VM before creating the snapshot')
     parser_vm_create.add_argument('-shutdown', action='store_true', help='Shutdown the VM before creating the snapshot')
-    parser_vm_create.set_defaults(context=VM, cmd='create')
+    parser_vm_create.set_defaults(build=lambda args, config: VM(args.vm, config), cmd='create', params=('suspend', 'shutdown'))
 
     parser_storage = subparser_storage.add_subparsers(title='Storage actions', required=True)
     parser_storage_create = parser_storage.add_parser('create', help='Create a snapshot of the storage using ONTAP volume snapshot')
-    parser_storage_create.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID')
-    parser_storage_create.set_defaults(context=Storage, cmd='create')
+    parser_storage_create.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID, a comma-separated list, or "all"')
+    parser_storage_create.add_argument('-no-borrow', action='store_true', help='Always create a snapshot, never borrow a just-created one')
+    parser_storage_create.set_defaults(build=lambda args, config: Storage(args.storage, config), cmd='create', params=('no_borrow',))
 
     parser_storage_restore = parser_storage.add_parser('restore', help='Restore an ONTAP volume snapshot to the storage')
-    parser_storage_restore.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID')
+    parser_storage_restore.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID, a comma-separated list, or "all"')
     parser_storage_restore.add_argument('-snapshot', type=str, required=True, help='Snapshot to restore')
-    parser_storage_restore.set_defaults(context=Storage, cmd='restore')
+    parser_storage_restore.set_defaults(build=lambda args, config: Storage(args.storage, config), cmd='restore', params=('snapshot',))
 
     parser_storage_delete = parser_storage.add_parser('delete', help='Delete an ONTAP volume snapshot')
-    parser_storage_delete.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID')
-    parser_storage_delete.add_argument('-snapshot', type=str, required=True, help='Snapshot to delete')
-    parser_storage_delete.set_defaults(context=Storage, cmd='delete')
+    parser_storage_delete.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID, a comma-separated list, or "all"')
+    parser_storage_delete.add_argument('-snapshot', type=str, required=True, help='Snapshot to delete, may be a glob like "proxmox_snapshot_2024*"')
+    parser_storage_delete.set_defaults(build=lambda args, config: Storage(args.storage, config), cmd='delete', params=('snapshot',))
 
     parser_storage_list = parser_storage.add_parser('list', help='List all ONTAP volume snapshots')
-    parser_storage_list.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID')
-    parser_storage_list.set_defaults(context=Storage, cmd='list')
+    parser_storage_list.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID, a comma-separated list, or "all"')
+    parser_storage_list.set_defaults(build=lambda args, config: Storage(args.storage, config), cmd='list', params=())
 
     parser_storage_mount = parser_storage.add_parser('mount', help='Mount an ONTAP volume snapshot and add it as new storage to PVE')
-    parser_storage_mount.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID')
+    parser_storage_mount.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID, a comma-separated list, or "all"')
     parser_storage_mount.add_argument('-snapshot', type=str, required=True, help='Snapshot to mount')
-    parser_storage_mount.set_defaults(context=Storage, cmd='mount')
+    parser_storage_mount.set_defaults(build=lambda args, config: Storage(args.storage, config), cmd='mount', params=('snapshot',))
 
     parser_storage_unmount = parser_storage.add_parser('unmount', help='Unmount an ONTAP volume snapshot and remove its storage from PVE')
-    parser_storage_unmount.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID')
-    parser_storage_unmount.set_defaults(context=Storage, cmd='unmount')
+    parser_storage_unmount.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID, a comma-separated list, or "all"')
+    parser_storage_unmount.set_defaults(build=lambda args, config: Storage(args.storage, config), cmd='unmount', params=())
 
     parser_storage_show = parser_storage.add_parser('show', help='Show metadata of the underlying ONTAP volume')
-    parser_storage_show.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID')
-    parser_storage_show.set_defaults(context=Storage, cmd='show')
+    parser_storage_show.add_argument('-storage', type=str, required=True, help='Proxmox Storage ID, a comma-separated list, or "all"')
+    parser_storage_show.set_defaults(build=lambda args, config: Storage(args.storage, config), cmd='show', params=())
 
-    argcomplete.autocomplete(parser)
-    args = parser.parse_args()
+    return parser
 
-    config = configparser.ConfigParser()
-    config.read(args.config)
+if __name__ == '__main__':
+    parser = build_parser()
+
+    # only pay the argcomplete import when a shell completion is actually running
+    if os.environ.get('_ARGCOMPLETE'):
+        import argcomplete
+        argcomplete.autocomplete(parser)
+    args = parser.parse_args()
 
-    logLevel = {
-        'info': logging.INFO,
-        'warn': logging.WARN,
-        'error': logging.ERROR,
-        'debug': logging.DEBUG
-    }
+    config = load_config(args.config)
 
-    logFormat = "%(levelname)s:%(filename)s:%(funcName)s:%(message)s"
+    logging.basicConfig(format=_LOG_FORMAT, level=_LOG_LEVELS[args.loglevel])
 
-    logging.basicConfig(format=logFormat, level=logLevel[args.loglevel])
+    # hand the command to a warm daemon only when explicitly requested
+    if args.via_daemon and args.func is not daemon and forward_to_daemon(sys.argv[1:]):
+        sys.exit(0)
     args.func(args)